@@ -381,7 +381,7 @@ class Target(AbstractTarget):
     self._walk(set(), work, predicate)
 
   def _walk(self, walked, work, predicate=None):
-    for target in self.resolve():
+    for target in self._walk_children():
       if target not in walked:
         walked.add(target)
         if not predicate or predicate(target):
@@ -393,6 +393,54 @@ class Target(AbstractTarget):
               if hasattr(additional_target, '_walk'):
                 additional_target._walk(walked, work, predicate)
 
+  def _walk_children(self):
+    """Returns the targets a walk descending from this target visits, in visit order.
+
+    Both ``walk`` and ``walk_all`` descend through this hook; subclasses with dependencies should
+    extend it rather than override ``_walk``.
+    """
+    return list(self.resolve())
+
+  @staticmethod
+  def walk_all(targets, work, predicate=None, walked=None):
+    """Walks the dependency graphs of the given targets visiting each node exactly once.
+
+    Equivalent to calling ``walk`` on each of the targets in turn with a shared set of walked
+    targets, but iterative so deep graphs do not exhaust the stack.  A ``walked`` set may be passed
+    to share visits across several calls.
+
+    :param targets: The :py:class:`twitter.pants.base.target.Target` roots to walk.
+    :param work: Callable that takes a :py:class:`twitter.pants.base.target.Target`
+      as its single argument.
+    :param predicate: Callable that takes a :py:class:`twitter.pants.base.target.Target`
+      as its single argument and returns True if the target should passed to ``work``.
+    :param set walked: An optional set of targets already walked; updated in place.
+    """
+    if not callable(work):
+      raise ValueError('work must be callable but was %s' % work)
+    if predicate and not callable(predicate):
+      raise ValueError('predicate must be callable but was %s' % predicate)
+
+    walked = set() if walked is None else walked
+
+    # Entries are (descend, target) pairs; descend entries stand in for the recursive _walk of the
+    # target, pushed so that its children are visited before any targets its work returned.
+    stack = [(True, target) for target in reversed(list(targets))]
+    while stack:
+      descend, target = stack.pop()
+      if descend:
+        stack.extend((False, child) for child in reversed(target._walk_children()))
+      elif target not in walked:
+        walked.add(target)
+        if not predicate or predicate(target):
+          additional_targets = work(target)
+          if additional_targets:
+            stack.extend((True, additional_target)
+                         for additional_target in reversed(list(additional_targets))
+                         if hasattr(additional_target, '_walk'))
+          if hasattr(target, '_walk'):
+            stack.append((True, target))
+
   @manual.builddict()
   def with_description(self, description):
     """Set a human-readable description of this target."""
@@ -228,17 +228,10 @@ class InternalTarget(Target):
     self._jar_dependencies.discard(dependency)
     self.update_dependencies([replacement])
 
-  def _walk(self, walked, work, predicate=None):
-    Target._walk(self, walked, work, predicate)
-    for dep in self.dependencies:
-      if isinstance(dep, Target) and not dep in walked:
-        walked.add(dep)
-        if not predicate or predicate(dep):
-          additional_targets = work(dep)
-          dep._walk(walked, work, predicate)
-          if additional_targets:
-            for additional_target in additional_targets:
-              additional_target._walk(walked, work, predicate)
+  def _walk_children(self):
+    children = Target._walk_children(self)
+    children.extend(dep for dep in self.dependencies if isinstance(dep, Target))
+    return children
 
   def _propagate_exclusives(self):
     # Note: this overrides Target._propagate_exclusives without
@@ -25,16 +25,8 @@ class TargetWithDependencies(Target):
     Target.__init__(self, name, exclusives=exclusives)
     self.dependencies = OrderedSet(resolve(dependencies)) if dependencies else OrderedSet()
 
-  def _walk(self, walked, work, predicate=None):
-    Target._walk(self, walked, work, predicate)
+  def _walk_children(self):
+    children = Target._walk_children(self)
     for dependency in self.dependencies:
-      for dep in dependency.resolve():
-        if isinstance(dep, Target) and not dep in walked:
-          walked.add(dep)
-          if not predicate or predicate(dep):
-            additional_targets = work(dep)
-            dep._walk(walked, work, predicate)
-            if additional_targets:
-              for additional_target in additional_targets:
-                if hasattr(additional_target, '_walk'):
-                  additional_target._walk(walked, work, predicate)
+      children.extend(dep for dep in dependency.resolve() if isinstance(dep, Target))
+    return children
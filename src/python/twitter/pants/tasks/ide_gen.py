@@ -14,18 +14,26 @@
 # limitations under the License.
 # ==================================================================================================
 
+import hashlib
 import os
 import shutil
 
+try:
+  import cPickle as pickle
+except ImportError:
+  import pickle
+
 from collections import defaultdict
 
 from twitter.common.collections.orderedset import OrderedSet
-from twitter.common.dirutil import safe_mkdir
+from twitter.common.dirutil import safe_delete, safe_mkdir, safe_mtime, safe_open
 
 from twitter.pants import (
     binary_util,
     get_buildroot)
 from twitter.pants.base.target import Target
+from twitter.pants.base.worker_pool import Work
+from twitter.pants.base.workunit import WorkUnit
 from twitter.pants.goal.phase import Phase
 from twitter.pants.targets.jvm_binary import JvmBinary
 from twitter.pants.tasks.checkstyle import Checkstyle
@@ -50,6 +58,27 @@ def is_java(target):
   return target.has_sources('.java') or target.is_java
 
 
+def _intern(path):
+  """Interns the given path if possible; only byte strings can be interned."""
+  return intern(path) if isinstance(path, str) else path
+
+
+# Bump whenever the pickled Project or SourceSet state, or the logic computing it, changes so that
+# project caches written by older versions are not re-used.
+_PROJECT_CACHE_VERSION = 2
+
+
+def _stage(src, dst):
+  """Stages the file at src to dst, hard linking where possible to avoid copying bytes."""
+  try:
+    os.link(src, dst)
+  except OSError:
+    # Cross-device links, filesystems without hard link support and existing dsts land here.  Never
+    # copy through an existing dst, it may be a hard link to some other staged file.
+    safe_delete(dst)
+    shutil.copy(src, dst)
+
+
 class IdeGen(JvmBinaryTask):
   @classmethod
   def setup_parser(cls, option_group, args, mkflag):
@@ -97,6 +126,12 @@ class IdeGen(JvmBinaryTask):
                             help="[%default] Includes scala sources in the project; otherwise "
                                  "compiles them and adds them to the project classpath.")
 
+    option_group.add_option(mkflag("cache"), mkflag("cache", negate=True), default=True,
+                            action="callback", callback=mkflag.set_bool, dest='ide_gen_cache',
+                            help="[%default] Re-uses the project configuration computed by the "
+                                 "previous run if none of the targets, BUILD files, source "
+                                 "directories or options it was computed from have changed.")
+
   def __init__(self, context):
     super(IdeGen, self).__init__(context)
 
@@ -123,6 +158,8 @@ class IdeGen(JvmBinaryTask):
     )
 
     self.intransitive = context.options.ide_gen_intransitive
+    self.cache_project = context.options.ide_gen_cache
+    self.project_cache = os.path.join(self.work_dir, '.project.cache')
 
     self.checkstyle_suppression_files = context.config.getdefault(
       'checkstyle_suppression_files', type=list, default=[]
@@ -172,19 +209,86 @@ class IdeGen(JvmBinaryTask):
                       debug_port,
                       jvm_targets,
                       not self.intransitive,
-                      self.context.new_workunit)
+                      self.context.new_workunit,
+                      record_inputs=self.cache_project,
+                      untracked_dirs=(self.work_dir, self._pants_workdir))
 
+    python_paths = None
     if self.python:
       python_source_paths = self.context.config.getlist('ide', 'python_source_paths', default=[])
       python_test_paths = self.context.config.getlist('ide', 'python_test_paths', default=[])
       python_lib_paths = self.context.config.getlist('ide', 'python_lib_paths', default=[])
-      project.configure_python(python_source_paths, python_test_paths, python_lib_paths)
+      python_paths = (python_source_paths, python_test_paths, python_lib_paths)
 
     extra_source_paths = self.context.config.getlist('ide', 'extra_jvm_source_paths', default=[])
     extra_test_paths = self.context.config.getlist('ide', 'extra_jvm_test_paths', default=[])
+
+    cache_key = None
+    if self.cache_project:
+      cache_key = self.project_cache_key(project, targets, python_paths,
+                                         (extra_source_paths, extra_test_paths))
+      all_targets = self.load_project(project, cache_key)
+      if all_targets is not None:
+        self.context.log.debug('Re-using the project configuration cached in %s'
+                               % self.project_cache)
+        return all_targets, project
+
+    if python_paths:
+      project.configure_python(*python_paths)
     all_targets = project.configure_jvm(extra_source_paths, extra_test_paths)
+
+    if cache_key:
+      self.store_project(project, cache_key, all_targets)
     return all_targets, project
 
+  def project_cache_key(self, project, targets, python_paths, extra_paths):
+    """Returns a key for the project configuration the given inputs produce.
+
+    Besides these inputs the configuration depends on the state of the filesystem; that is checked
+    separately against the inputs the project records as it is configured.
+    """
+    sha = hashlib.sha1()
+    sha.update(str(_PROJECT_CACHE_VERSION))
+    sha.update(repr((project.name, project.root_dir, project.has_python, project.skip_java,
+                     project.skip_scala, project.transitive, python_paths, extra_paths)))
+    sha.update(repr([target.id for target in project.targets]))
+    for target in targets:
+      sha.update(target.id)
+      sha.update(repr(getattr(target, 'sources', None)))
+    return sha.hexdigest()
+
+  def load_project(self, project, cache_key):
+    """Restores the project's configuration from the project cache if still valid.
+
+    Returns the full set of targets the project is comprised of or None if there was no valid
+    cached configuration.
+    """
+    try:
+      with open(self.project_cache, 'rb') as cache:
+        key, mtimes, state, addresses = pickle.load(cache)
+    except Exception:
+      # A missing cache just means this is the first run, an unreadable one is simply replaced.
+      return None
+
+    if key != cache_key:
+      return None
+    if any(safe_mtime(path) != mtime for path, mtime in mtimes.items()):
+      return None
+
+    targets = [Target.get(address) for address in addresses]
+    if not all(targets):
+      return None
+
+    project.restore_state(state)
+    return targets
+
+  def store_project(self, project, cache_key, targets):
+    mtimes = dict((path, safe_mtime(path)) for path in project.inputs)
+    addresses = [target.address for target in targets]
+    with safe_open(self.project_cache, 'wb') as cache:
+      pickle.dump((cache_key, mtimes, project.save_state(), addresses), cache,
+                  pickle.HIGHEST_PROTOCOL)
+
   def configure_compile_context(self, targets):
     """
       Trims the context's target set to just those targets needed as jars on the IDE classpath.
@@ -204,19 +308,24 @@ class IdeGen(JvmBinaryTask):
         (self.intransitive and target not in self.context.target_roots)
       )
 
+    # The jars and excludes define the external jars binary, so their order is significant and
+    # they need de-duping.  The compiles are already de-duped by their shared walk.
     jars = OrderedSet()
     excludes = OrderedSet()
-    compiles = OrderedSet()
+    compiles = []
+    compiles_walked = set()
     def prune(target):
       if target.is_jvm:
         if target.excludes:
           excludes.update(target.excludes)
-        jars.update(jar for jar in target.jar_dependencies if jar.rev)
-        if is_cp(target):
-          target.walk(compiles.add)
+        for jar in target.jar_dependencies:
+          if jar.rev:
+            jars.add(jar)
+        # A target already swept into the compiles brought its full closure along with it.
+        if target not in compiles_walked and is_cp(target):
+          Target.walk_all([target], compiles.append, walked=compiles_walked)
 
-    for target in targets:
-      target.walk(prune)
+    Target.walk_all(targets, prune)
 
     self.context.replace_targets(compiles)
 
@@ -232,6 +341,18 @@ class IdeGen(JvmBinaryTask):
       str(t) for t in self.context.targets())
     )
 
+  def _stage_all(self, staging):
+    """Stages each (src, dst) pair in the given sequence on the foreground worker pool.
+
+    When several pairs share a dst the last one wins, just as if they were staged in sequence.  The
+    first staging failure, if any, is re-raised.
+    """
+    srcs_by_dst = dict((dst, src) for src, dst in staging)
+    with self.context.new_workunit(name='stage', labels=[WorkUnit.MULTITOOL]) as parent:
+      self.context.submit_foreground_work_and_wait(
+        Work(_stage, [(src, dst) for dst, src in srcs_by_dst.items()], 'stage'),
+        workunit_parent=parent)
+
   def map_internal_jars(self, targets):
     internal_jar_dir = os.path.join(self.work_dir, 'internal-libs')
     safe_mkdir(internal_jar_dir, clean=True)
@@ -241,6 +362,8 @@ class IdeGen(JvmBinaryTask):
 
     internal_jars = self.context.products.get('jars')
     internal_source_jars = self.context.products.get('source_jars')
+    staging = []
+    entries = []
     for target in targets:
       mappings = internal_jars.get(target)
       if mappings:
@@ -250,7 +373,7 @@ class IdeGen(JvmBinaryTask):
 
           jar = jars[0]
           cp_jar = os.path.join(internal_jar_dir, jar)
-          shutil.copy(os.path.join(base, jar), cp_jar)
+          staging.append((os.path.join(base, jar), cp_jar))
 
           cp_source_jar = None
           mappings = internal_source_jars.get(target)
@@ -262,9 +385,12 @@ class IdeGen(JvmBinaryTask):
                 )
               jar = jars[0]
               cp_source_jar = os.path.join(internal_source_jar_dir, jar)
-              shutil.copy(os.path.join(base, jar), cp_source_jar)
+              staging.append((os.path.join(base, jar), cp_source_jar))
+
+          entries.append(ClasspathEntry(cp_jar, source_jar=cp_source_jar))
 
-          self._project.internal_jars.add(ClasspathEntry(cp_jar, source_jar=cp_source_jar))
+    self._stage_all(staging)
+    self._project.internal_jars.update(entries)
 
   def map_external_jars(self):
     external_jar_dir = os.path.join(self.work_dir, 'external-libs')
@@ -277,27 +403,30 @@ class IdeGen(JvmBinaryTask):
     safe_mkdir(external_javadoc_jar_dir, clean=True)
 
     confs = ['default', 'sources', 'javadoc']
+    staging = []
+    entries = []
     for entry in self.list_jar_dependencies(self.binary, confs=confs):
       jar = entry.get('default')
       if jar:
         cp_jar = os.path.join(external_jar_dir, os.path.basename(jar))
-        shutil.copy(jar, cp_jar)
+        staging.append((jar, cp_jar))
 
         cp_source_jar = None
         source_jar = entry.get('sources')
         if source_jar:
           cp_source_jar = os.path.join(external_source_jar_dir, os.path.basename(source_jar))
-          shutil.copy(source_jar, cp_source_jar)
+          staging.append((source_jar, cp_source_jar))
 
         cp_javadoc_jar = None
         javadoc_jar = entry.get('javadoc')
         if javadoc_jar:
           cp_javadoc_jar = os.path.join(external_javadoc_jar_dir, os.path.basename(javadoc_jar))
-          shutil.copy(javadoc_jar, cp_javadoc_jar)
+          staging.append((javadoc_jar, cp_javadoc_jar))
 
-        self._project.external_jars.add(ClasspathEntry(cp_jar,
-                                                       source_jar=cp_source_jar,
-                                                       javadoc_jar=cp_javadoc_jar))
+        entries.append(ClasspathEntry(cp_jar, source_jar=cp_source_jar, javadoc_jar=cp_javadoc_jar))
+
+    self._stage_all(staging)
+    self._project.external_jars.update(entries)
 
   def execute(self, targets):
     """Stages IDE project artifacts to a project directory and generates IDE configuration files."""
@@ -329,6 +458,9 @@ class IdeGen(JvmBinaryTask):
 
 class ClasspathEntry(object):
   """Represents a classpath entry that may have sources available."""
+
+  __slots__ = ('jar', 'source_jar', 'javadoc_jar')
+
   def __init__(self, jar, source_jar=None, javadoc_jar=None):
     self.jar = jar
     self.source_jar = source_jar
@@ -338,7 +470,9 @@ class ClasspathEntry(object):
 class SourceSet(object):
   """Models a set of source files."""
 
-  TEST_BASES = set()
+  # Large projects have thousands of source sets, so keep them small and share their paths, which
+  # are drawn from a handful of roots and source bases.
+  __slots__ = ('root_dir', 'source_base', 'path', 'is_test', '_excludes')
 
   def __init__(self, root_dir, source_base, path, is_test):
     """
@@ -348,13 +482,11 @@ class SourceSet(object):
       is_test: true iff the sources contained by this set implement test cases
     """
 
-    self.root_dir = root_dir
-    self.source_base = source_base
-    self.path = path
+    self.root_dir = _intern(root_dir)
+    self.source_base = _intern(source_base)
+    self.path = _intern(path)
     self.is_test = is_test
     self._excludes = []
-    if is_test:
-      SourceSet.TEST_BASES.add(self.source_base)
 
   @property
   def excludes(self):
@@ -366,6 +498,10 @@ class SourceSet(object):
 class Project(object):
   """Models a generic IDE project that is comprised of a set of BUILD targets."""
 
+  # The attributes that make up a configured project, see save_state and restore_state.
+  _CONFIGURED_STATE = ('sources', 'py_sources', 'py_libs', 'resource_extensions', 'test_bases',
+                       'has_scala', 'has_tests')
+
   @staticmethod
   def extract_resource_extensions(resources):
     """Returns the set of unique extensions (including the .) from the given resource files."""
@@ -376,13 +512,25 @@ class Project(object):
         yield ext
 
   def __init__(self, name, has_python, skip_java, skip_scala, root_dir,
-               checkstyle_suppression_files, debug_port, targets, transitive, workunit_factory):
+               checkstyle_suppression_files, debug_port, targets, transitive, workunit_factory,
+               record_inputs=False, untracked_dirs=()):
     """Creates a new, unconfigured, Project based at root_dir and comprised of the sources visible
-    to the given targets."""
+    to the given targets.
+
+    If record_inputs is True the BUILD files and directories the configuration is computed from
+    are collected in inputs, leaving out the untracked_dirs and everything beneath them.
+    """
 
     self.name = name
     self.root_dir = root_dir
-    self.targets = OrderedSet(targets)
+    # The targets are only iterated in order and tested for membership; a de-duped list backed by
+    # a set does both without the per-element overhead of an OrderedSet.
+    self.targets = []
+    self._targets_set = set()
+    for target in targets:
+      if target not in self._targets_set:
+        self._targets_set.add(target)
+        self.targets.append(target)
     self.transitive = transitive
     self.workunit_factory = workunit_factory
 
@@ -390,6 +538,7 @@ class Project(object):
     self.py_sources = []
     self.py_libs = []
     self.resource_extensions = set()
+    self.test_bases = set() # The source bases of all test source sets.
 
     self.has_python = has_python
     self.skip_java = skip_java
@@ -403,13 +552,92 @@ class Project(object):
     self.internal_jars = OrderedSet()
     self.external_jars = OrderedSet()
 
+    # The BUILD files and directories the configuration was computed from.  Pants writes to its
+    # work dirs on every run, so tracking them would invalidate any cache of the configuration.
+    self.record_inputs = record_inputs
+    self.inputs = set()
+    self._untracked_dirs = set()
+    for path in untracked_dirs:
+      if path:
+        self._untracked_dirs.add(os.path.abspath(path))
+        self._untracked_dirs.add(os.path.realpath(path))
+
+    # BUILD file parsing and scanning for related BUILD files is expensive and the same BUILD files
+    # are consulted for every target they or their neighbors define, so both are memoized here.
+    self._addresses_by_bf = {}
+    self._bf_neighbors = {}
+    self._scanned_trees = set()
+
+  def save_state(self):
+    """Returns the picklable configuration of this project."""
+
+    return dict((name, getattr(self, name)) for name in Project._CONFIGURED_STATE)
+
+  def restore_state(self, state):
+    """Configures this project from the state returned by an equivalent project's save_state."""
+
+    for name in Project._CONFIGURED_STATE:
+      setattr(self, name, state[name])
+
+  def _addresses(self, buildfile):
+    """Returns the addresses of the targets defined in the given BUILD file."""
+
+    addresses = self._addresses_by_bf.get(buildfile)
+    if addresses is None:
+      addresses = Target.get_all_addresses(buildfile)
+      self._addresses_by_bf[buildfile] = addresses
+    return addresses
+
+  def _neighbors(self, buildfile):
+    """Returns a tuple of the ancestor, sibling and descendant BUILD files of the given BUILD file.
+
+    Each is itself a tuple of BUILD files.
+    """
+
+    neighbors = self._bf_neighbors.get(buildfile)
+    if neighbors is None:
+      neighbors = (tuple(buildfile.ancestors()),
+                   tuple(buildfile.siblings()),
+                   tuple(buildfile.descendants()))
+      self._bf_neighbors[buildfile] = neighbors
+      if self.record_inputs:
+        self._record_neighborhood(buildfile)
+    return neighbors
+
+  def _record_neighborhood(self, buildfile):
+    """Records the directories searched for the given BUILD file's neighbors as inputs.
+
+    These are its ancestor directories up to and including the build root and every directory
+    beneath its own, bar the untracked dirs; a new BUILD file in any of them changes that
+    directory's mtime.
+    """
+    covered = buildfile.parent_path in self._scanned_trees
+    path = buildfile.parent_path
+    while path != buildfile.root_dir and path != os.path.dirname(path):
+      path = os.path.dirname(path)
+      self.inputs.add(path)
+      covered = covered or path in self._scanned_trees
+
+    # Nested BUILD files search overlapping trees, only walk those not already recorded.
+    if not covered:
+      self._scanned_trees.add(buildfile.parent_path)
+      for path, dirs, _ in os.walk(buildfile.parent_path):
+        self.inputs.add(path)
+        dirs[:] = [d for d in dirs if os.path.join(path, d) not in self._untracked_dirs]
+
   def configure_python(self, source_roots, test_roots, lib_roots):
-    self.py_sources.extend(SourceSet(get_buildroot(), root, None, False) for root in source_roots)
-    self.py_sources.extend(SourceSet(get_buildroot(), root, None, True) for root in test_roots)
+    buildroot = get_buildroot()
+    self.py_sources.extend(SourceSet(buildroot, root, None, False) for root in source_roots)
+    self.py_sources.extend(SourceSet(buildroot, root, None, True) for root in test_roots)
+    self.test_bases.update(test_roots)
     for root in lib_roots:
-      for path in os.listdir(os.path.join(get_buildroot(), root)):
-        if os.path.isdir(os.path.join(get_buildroot(), root, path)) or path.endswith('.egg'):
-          self.py_libs.append(SourceSet(get_buildroot(), root, path, False))
+      lib_root = os.path.join(buildroot, root)
+      if self.record_inputs:
+        self.inputs.add(lib_root)
+      for path in os.listdir(lib_root):
+        # Check the name first, it saves a stat for every egg.
+        if path.endswith('.egg') or os.path.isdir(os.path.join(lib_root, path)):
+          self.py_libs.append(SourceSet(buildroot, root, path, False))
 
   def configure_jvm(self, extra_source_paths, extra_test_paths):
     """
@@ -421,72 +649,101 @@ class Project(object):
     # TODO(John Sirois): much waste lies here, revisit structuring for more readable and efficient
     # construction of source sets and excludes ... and add a test!
 
-    analyzed = OrderedSet()
+    analyzed = []
     targeted = set()
 
+    # The walk predicate is also consulted for every sibling candidate of every analyzed target, so
+    # memoize it rather than re-scanning target sources each time.
+    source_targets = {}
     def source_target(target):
-      return ((self.transitive or target in self.targets) and
-              target.has_sources() and
-              (not target.is_codegen and
-               not (self.skip_java and is_java(target)) and
-               not (self.skip_scala and is_scala(target))))
+      if target not in source_targets:
+        source_targets[target] = bool(
+          (self.transitive or target in self._targets_set) and
+          target.has_sources() and
+          (not target.is_codegen and
+           not (self.skip_java and is_java(target)) and
+           not (self.skip_scala and is_scala(target))))
+      return source_targets[target]
 
     def configure_source_sets(relative_base, sources, is_test):
-      absolute_base = os.path.join(self.root_dir, relative_base)
-      paths = set([ os.path.dirname(source) for source in sources])
+      # This runs for every resource and source dir of every analyzed target, keep lookups local.
+      join = os.path.join
+      add_targeted = targeted.add
+      add_source_set = self.sources.append
+      root_dir = self.root_dir
+
+      absolute_base = join(root_dir, relative_base)
+      paths = set(os.path.dirname(source) for source in sources)
+      added = False
       for path in paths:
-        absolute_path = os.path.join(absolute_base, path)
+        absolute_path = join(absolute_base, path)
         if absolute_path not in targeted:
-          targeted.add(absolute_path)
-          self.sources.append(SourceSet(self.root_dir, relative_base, path, is_test))
-
+          add_targeted(absolute_path)
+          add_source_set(SourceSet(root_dir, relative_base, path, is_test))
+          added = True
+      if is_test and added:
+        self.test_bases.add(relative_base)
+
+    # Targets in the same BUILD file share their candidate siblings.
+    candidates_by_buildfile = {}
+    def find_candidates(buildfile):
+      candidates = candidates_by_buildfile.get(buildfile)
+      if candidates is None:
+        candidates = OrderedSet(self._addresses(buildfile))
+        for neighbors in self._neighbors(buildfile):
+          for neighbor in neighbors:
+            candidates.update(self._addresses(neighbor))
+        candidates_by_buildfile[buildfile] = candidates
+      return candidates
+
+    basedirs_by_target = {}
     def find_source_basedirs(target):
-      dirs = set()
-      if source_target(target):
-        absolute_base = os.path.join(self.root_dir, target.target_base)
-        dirs.update([ os.path.join(absolute_base, os.path.dirname(source))
-                      for source in target.sources ])
+      dirs = basedirs_by_target.get(target)
+      if dirs is None:
+        if source_target(target):
+          absolute_base = os.path.join(self.root_dir, target.target_base)
+          dirs = set(os.path.join(absolute_base, os.path.dirname(source))
+                     for source in target.sources)
+        else:
+          dirs = set()
+        basedirs_by_target[target] = dirs
       return dirs
 
     def configure_target(target):
-      if target not in analyzed:
-        analyzed.add(target)
-
-        self.has_scala = not self.skip_scala and (self.has_scala or is_scala(target))
-
-        if target.has_resources:
-          resources_by_basedir = defaultdict(set)
-          for resources in target.resources:
-            resources_by_basedir[resources.target_base].update(resources.sources)
-          for basedir, resources in resources_by_basedir.items():
-            self.resource_extensions.update(Project.extract_resource_extensions(resources))
-            configure_source_sets(basedir, resources, is_test=False)
-
-        if target.sources:
-          test = target.is_test
-          self.has_tests = self.has_tests or test
-          configure_source_sets(target.target_base, target.sources, is_test = test)
-
-        # Other BUILD files may specify sources in the same directory as this target.  Those BUILD
-        # files might be in parent directories (globs('a/b/*.java')) or even children directories if
-        # this target globs children as well.  Gather all these candidate BUILD files to test for
-        # sources they own that live in the directories this targets sources live in.
-        target_dirset = find_source_basedirs(target)
-        candidates = Target.get_all_addresses(target.address.buildfile)
-        for ancestor in target.address.buildfile.ancestors():
-          candidates.update(Target.get_all_addresses(ancestor))
-        for sibling in target.address.buildfile.siblings():
-          candidates.update(Target.get_all_addresses(sibling))
-        for descendant in target.address.buildfile.descendants():
-          candidates.update(Target.get_all_addresses(descendant))
-
-        def is_sibling(target):
-          return source_target(target) and target_dirset.intersection(find_source_basedirs(target))
-
-        return filter(is_sibling, [ Target.get(a) for a in candidates if a != target.address ])
-
-    for target in self.targets:
-      target.walk(configure_target, predicate = source_target)
+      # The walk hands each target over exactly once.
+      analyzed.append(target)
+
+      self.has_scala = not self.skip_scala and (self.has_scala or is_scala(target))
+
+      if target.has_resources:
+        # Duplicates are harmless here, both consumers below de-dup.
+        resources_by_basedir = defaultdict(list)
+        for resources in target.resources:
+          resources_by_basedir[resources.target_base].extend(resources.sources)
+        for basedir, resources in resources_by_basedir.items():
+          self.resource_extensions.update(os.path.splitext(resource)[1] for resource in resources)
+          configure_source_sets(basedir, resources, is_test=False)
+
+      if target.sources:
+        test = target.is_test
+        self.has_tests = self.has_tests or test
+        configure_source_sets(target.target_base, target.sources, is_test = test)
+
+      # Other BUILD files may specify sources in the same directory as this target.  Those BUILD
+      # files might be in parent directories (globs('a/b/*.java')) or even children directories if
+      # this target globs children as well.  Gather all these candidate BUILD files to test for
+      # sources they own that live in the directories this targets sources live in.
+      target_dirset = find_source_basedirs(target)
+      candidates = find_candidates(target.address.buildfile)
+
+      def is_sibling(target):
+        # Non-source targets have no basedirs and so are never siblings.
+        return target is not None and not target_dirset.isdisjoint(find_source_basedirs(target))
+
+      siblings = (Target.get(a) for a in candidates if a != target.address)
+      return (sibling for sibling in siblings if is_sibling(sibling))
+
+    Target.walk_all(self.targets, configure_target, predicate=source_target)
 
     # We need to figure out excludes, in doing so there are 2 cases we should not exclude:
     # 1.) targets depend on A only should lead to an exclude of B
@@ -504,34 +761,51 @@ class Project(object):
     unexcludable_paths = set()
     for source_set in self.sources:
       parent = os.path.join(self.root_dir, source_set.source_base, source_set.path)
-      while True:
+      # No need to add the repo root or above, all source paths and extra paths are children.  Each
+      # path is added along with all its ancestors, so we can also stop at the first one already
+      # seen - source sets share most of their ancestry.
+      while parent != self.root_dir and parent not in unexcludable_paths:
         unexcludable_paths.add(parent)
-        parent, _ = os.path.split(parent)
-        # no need to add the repo root or above, all source paths and extra paths are children
-        if parent == self.root_dir:
-          break
+        parent = os.path.dirname(parent)
 
+    # Nothing beneath an excluded directory can be targeted or unexcludable, so the scan for
+    # excludes prunes there instead of walking the full tree under every source set.
+    record_inputs = self.record_inputs
     for source_set in self.sources:
-      paths = set()
       source_base = os.path.join(self.root_dir, source_set.source_base)
-      for root, dirs, _ in os.walk(os.path.join(source_base, source_set.path)):
-        if dirs:
-          paths.update([os.path.join(root, directory) for directory in dirs])
-      unused_children = paths - targeted
-      if unused_children:
-        for child in unused_children:
-          if child not in unexcludable_paths:
-            source_set.excludes.append(os.path.relpath(child, source_base))
-
-    targets = OrderedSet()
-    for target in self.targets:
-      target.walk(lambda target: targets.add(target), source_target)
-    targets.update(analyzed - targets)
+      # Every scanned path is joined onto the source base, so slicing off this prefix gives the
+      # same result os.path.relpath would without its normalization overhead.
+      source_base_prefix_length = len(os.path.join(source_base, ''))
+      parents = [os.path.join(source_base, source_set.path)]
+      while parents:
+        parent = parents.pop()
+        try:
+          children = os.listdir(parent)
+        except OSError:
+          continue
+        if record_inputs:
+          self.inputs.add(parent)
+        for child in sorted(children):
+          path = os.path.join(parent, child)
+          if os.path.isdir(path):
+            if path not in targeted and path not in unexcludable_paths:
+              if record_inputs and path not in self._untracked_dirs:
+                self.inputs.add(path)
+              source_set.excludes.append(path[source_base_prefix_length:])
+            elif not os.path.islink(path):
+              parents.append(path)
+
+    # New BUILD files, or new sources globbed by existing ones, change the mtime of the directory
+    # they land in - all of which are recorded as inputs along with the BUILD files consulted.
+    if record_inputs:
+      self.inputs.update(buildfile.full_path for buildfile in self._addresses_by_bf)
+      self.inputs.update(unexcludable_paths)
 
     self.sources.extend(SourceSet(get_buildroot(), p, None, False) for p in extra_source_paths)
     self.sources.extend(SourceSet(get_buildroot(), p, None, True) for p in extra_test_paths)
+    self.test_bases.update(extra_test_paths)
 
-    return targets
+    return analyzed
 
   def set_tool_classpaths(self, checkstyle_classpath, scalac_classpath):
     self.checkstyle_classpath = checkstyle_classpath
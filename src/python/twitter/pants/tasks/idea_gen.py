@@ -26,7 +26,7 @@ from twitter.common.dirutil import safe_mkdir
 from twitter.pants.targets import JavaTests, ScalaTests, SourceRoot
 from twitter.pants.base.build_environment import get_buildroot
 from twitter.pants.base.generator import TemplateData, Generator
-from twitter.pants.tasks.ide_gen import IdeGen, Project, SourceSet
+from twitter.pants.tasks.ide_gen import IdeGen, Project
 
 
 _TEMPLATE_BASEDIR = 'templates/idea'
@@ -129,7 +129,7 @@ class IdeaGen(IdeGen):
       # Non test targets that otherwise live in test target roots (say a java_library), must
       # be marked as test for IDEA to correctly link the targets with the test code that uses
       # them. Therefore we check the base instead of the is_test flag.
-      return source_set.source_base in SourceSet.TEST_BASES
+      return source_set.source_base in project.test_bases
 
     def create_content_root(source_set):
       root_relative_path = os.path.join(source_set.source_base, source_set.path) \
@@ -16,8 +16,11 @@
 
 import unittest
 
+from textwrap import dedent
+
 from twitter.pants.base import ParseContext
 from twitter.pants.base.target import Target, TargetDefinitionException
+from twitter.pants.base_build_root_test import BaseBuildRootTest
 
 
 class TargetTest(unittest.TestCase):
@@ -27,3 +30,74 @@ class TargetTest(unittest.TestCase):
       self.assertRaises(TargetDefinitionException, Target, name=None)
       name = "test"
       self.assertEquals(Target(name=name).name, name)
+
+
+class TargetWalkTest(BaseBuildRootTest):
+
+  @classmethod
+  def setUpClass(cls):
+    super(TargetWalkTest, cls).setUpClass()
+
+    # A diamond a -> (b, c) -> d for both InternalTarget and TargetWithDependencies flavors, with
+    # an unreachable e that work hands back when it visits b.
+    for target_type in ('java_library', 'python_library'):
+      def create_library(name, *dependencies):
+        cls.create_target('%s/%s' % (target_type, name), dedent('''
+          %(target_type)s(name='%(name)s',
+            sources=[],
+            dependencies=[%(dependencies)s],
+          )
+        ''' % dict(target_type=target_type,
+                    name=name,
+                    dependencies=', '.join("pants('%s/%s')" % (target_type, dep)
+                                           for dep in dependencies))))
+
+      create_library('a', 'b', 'c')
+      create_library('b', 'd')
+      create_library('c', 'd')
+      create_library('d')
+      create_library('e', 'd')
+
+  def assert_walk_order(self, target_type, expected_names, predicate_excludes=()):
+    root = self.target('%s/a' % target_type)
+    extra = self.target('%s/e' % target_type)
+
+    def predicate(target):
+      return target.name not in predicate_excludes
+
+    def collector(visited):
+      def work(target):
+        visited.append(target.name)
+        return [extra] if target.name == 'b' else None
+      return work
+
+    walked = []
+    root.walk(collector(walked), predicate)
+    self.assertEqual(expected_names, walked)
+
+    walked_all = []
+    Target.walk_all([root], collector(walked_all), predicate)
+    self.assertEqual(walked, walked_all)
+
+  def test_walk_all_matches_walk(self):
+    for target_type in ('java_library', 'python_library'):
+      self.assert_walk_order(target_type, ['a', 'b', 'd', 'e', 'c'])
+
+  def test_walk_all_matches_walk_with_predicate(self):
+    for target_type in ('java_library', 'python_library'):
+      self.assert_walk_order(target_type, ['a', 'c', 'd'], predicate_excludes=('b',))
+      self.assert_walk_order(target_type, ['a', 'b', 'd', 'e'], predicate_excludes=('c',))
+      # A root the predicate rejects is not worked, but its dependencies still are.
+      self.assert_walk_order(target_type, ['b', 'd', 'e', 'c'], predicate_excludes=('a',))
+
+  def test_walk_all_shares_walked(self):
+    a = self.target('java_library/a')
+    d = self.target('java_library/d')
+    e = self.target('java_library/e')
+
+    visited = []
+    walked = set()
+    Target.walk_all([d, e], visited.append, walked=walked)
+    Target.walk_all([a], visited.append, walked=walked)
+    self.assertEqual([d, e, a, self.target('java_library/b'), self.target('java_library/c')],
+                     visited)
@@ -0,0 +1,372 @@
+# ==================================================================================================
+# Copyright 2013 Twitter, Inc.
+# --------------------------------------------------------------------------------------------------
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this work except in compliance with the License.
+# You may obtain a copy of the License in the LICENSE file, or at:
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==================================================================================================
+
+import os
+
+from textwrap import dedent
+
+from twitter.common.dirutil import safe_mkdir, safe_mkdtemp, safe_rmtree
+
+from twitter.pants.base.context_utils import create_context
+from twitter.pants.base_build_root_test import BaseBuildRootTest
+from twitter.pants.tasks import ide_gen
+from twitter.pants.tasks.ide_gen import IdeGen, Project
+
+
+class ProjectExcludesTest(BaseBuildRootTest):
+
+  @classmethod
+  def setUpClass(cls):
+    super(ProjectExcludesTest, cls).setUpClass()
+
+    # src/java
+    #   BUILD              main: Main.java, com/a/A.java, com/c/C.java, com/link/L.java
+    #   com/a/sub/deeper   untargeted beneath a targeted dir
+    #   com/b/deep         untargeted, and so is everything beneath it
+    #   com/d/e/BUILD      e: E.java - so com/d is unexcludable
+    #   com/d/e/gen
+    #   com/d/x
+    #   com/link -> ../other
+    #   other/inner
+    cls.create_target('src/java', dedent('''
+      java_library(name='main',
+        sources=['Main.java', 'com/a/A.java', 'com/c/C.java', 'com/link/L.java'],
+      )
+    '''))
+    cls.create_target('src/java/com/d/e', dedent('''
+      java_library(name='e',
+        sources=['E.java'],
+      )
+    '''))
+    for path in ('Main.java', 'com/a/A.java', 'com/c/C.java', 'com/d/e/E.java', 'other/L.java'):
+      cls.create_file(os.path.join('src/java', path))
+    for path in ('com/a/sub/deeper', 'com/b/deep', 'com/d/e/gen', 'com/d/x', 'other/inner'):
+      cls.create_dir(os.path.join('src/java', path))
+    os.symlink(os.path.join('..', 'other'), os.path.join(cls.build_root, 'src/java/com/link'))
+
+  def configure(self, *addresses):
+    targets = [self.target(address) for address in addresses]
+    project = Project('test', False, False, False, self.build_root, [], None, targets,
+                      transitive=True, workunit_factory=None)
+    project.configure_jvm(extra_source_paths=(), extra_test_paths=())
+    return dict(((source_set.source_base, source_set.path), source_set.excludes)
+                for source_set in project.sources)
+
+  def test_excludes(self):
+    excludes = self.configure('src/java:main', 'src/java/com/d/e:e')
+
+    self.assertEqual(set([('src/java', ''),
+                          ('src/java', 'com/a'),
+                          ('src/java', 'com/c'),
+                          ('src/java', 'com/link'),
+                          ('src/java/com/d/e', '')]),
+                     set(excludes.keys()))
+
+    # Each directory's children are scanned in sorted order, depth first, and the scan neither
+    # descends below an excluded directory nor through the com/link symlink.
+    self.assertEqual(['other', 'com/b', 'com/d/x', 'com/d/e/gen', 'com/a/sub'],
+                     excludes[('src/java', '')])
+    self.assertEqual(['com/a/sub'], excludes[('src/java', 'com/a')])
+    self.assertEqual([], excludes[('src/java', 'com/c')])
+    self.assertEqual(['com/link/inner'], excludes[('src/java', 'com/link')])
+    self.assertEqual(['gen'], excludes[('src/java/com/d/e', '')])
+
+  def test_excludes_without_unexcludable_children(self):
+    excludes = self.configure('src/java:main')
+
+    # Without e nothing keeps com/d, so it is excluded whole.
+    self.assertEqual(['other', 'com/b', 'com/d', 'com/a/sub'], excludes[('src/java', '')])
+
+
+class RecordingIdeGen(IdeGen):
+  """Counts the project configurations written to the project cache - one per cache miss."""
+
+  def __init__(self, context):
+    self.stores = 0
+    super(RecordingIdeGen, self).__init__(context)
+
+  def store_project(self, project, cache_key, targets):
+    self.stores += 1
+    super(RecordingIdeGen, self).store_project(project, cache_key, targets)
+
+  def configure_compile_context(self, targets):
+    # Not cached, and it registers a synthetic binary target that only one instance may define.
+    pass
+
+
+class ProjectCacheTestBase(BaseBuildRootTest):
+  """Runs IdeGen against a project dir under the pants workdir, as by default."""
+
+  target_address = None
+
+  def setUp(self):
+    self.pants_workdir = os.path.join(self.build_root, '.pants.d')
+    self.project_dir = safe_mkdtemp(dir=self.pants_workdir)
+    self.config = dict(extra_jvm_source_paths=[], python_source_paths=[])
+    self.options = dict(ide_gen_project_name='project',
+                        ide_gen_project_dir=self.project_dir,
+                        ide_gen_project_cwd=None,
+                        ide_gen_intransitive=False,
+                        ide_gen_python=False,
+                        ide_gen_java=True,
+                        ide_gen_java_language_level=6,
+                        ide_gen_java_jdk=None,
+                        ide_gen_scala=True,
+                        ide_gen_cache=True)
+
+  def tearDown(self):
+    safe_rmtree(self.project_dir)
+
+  def ide_gen(self):
+    ini = dedent('''
+      [DEFAULT]
+      pants_workdir: %(workdir)s
+
+      [ide]
+      workdir: %(workdir)s/ide
+      debug_port: 5005
+      extra_jvm_source_paths: %(extra_jvm_source_paths)r
+      python_source_paths: %(python_source_paths)r
+    ''' % dict(self.config, workdir=self.pants_workdir)).strip()
+    context = create_context(config=ini, options=self.options,
+                             target_roots=[self.target(self.target_address)])
+    return RecordingIdeGen(context)
+
+  def assert_hit(self):
+    self.assertEqual(0, self.ide_gen().stores)
+
+  def assert_miss(self):
+    self.assertEqual(1, self.ide_gen().stores)
+
+  def prime(self):
+    # Back-date the whole tree so the changes a test makes are visible at any mtime resolution.
+    for root, dirs, files in os.walk(self.build_root):
+      for path in [root] + [os.path.join(root, f) for f in files]:
+        os.utime(path, (1000000000, 1000000000))
+    self.assert_miss()
+    self.assert_hit()
+
+
+class ProjectCacheTest(ProjectCacheTestBase):
+
+  target_address = 'src/java:main'
+
+  @classmethod
+  def setUpClass(cls):
+    super(ProjectCacheTest, cls).setUpClass()
+
+    cls.create_target('src/java', dedent('''
+      java_library(name='main',
+        sources=['com/a/A.java'],
+      )
+    '''))
+    cls.create_file('src/java/com/a/A.java')
+    cls.create_dir('src/java/com/b/deep')
+    cls.create_dir('.pants.d')
+
+  def test_hit(self):
+    self.prime()
+
+    configured = self.ide_gen()
+    cached = self.ide_gen()
+    self.assertEqual(0, cached.stores)
+    self.assertEqual(configured.context.targets(), cached.context.targets())
+    self.assertEqual(configured._project.save_state().keys(), cached._project.save_state().keys())
+    self.assertEqual([(s.source_base, s.path, s.excludes) for s in configured._project.sources],
+                     [(s.source_base, s.path, s.excludes) for s in cached._project.sources])
+
+  def test_miss_build_file_touched(self):
+    self.prime()
+    os.utime(os.path.join(self.build_root, 'src/java/BUILD'), None)
+    self.assert_miss()
+    self.assert_hit()
+
+  def test_miss_source_dir_added(self):
+    self.prime()
+    self.create_dir('src/java/com/a/b')
+    self.assert_miss()
+    self.assert_hit()
+
+  def test_miss_source_added(self):
+    self.prime()
+    self.create_file('src/java/com/a/B.java')
+    self.assert_miss()
+    self.assert_hit()
+
+  def test_miss_build_file_added_below_excluded_dir(self):
+    self.prime()
+    self.create_file('src/java/com/b/deep/BUILD')
+    self.assert_miss()
+    self.assert_hit()
+
+  def test_miss_build_file_added_at_build_root(self):
+    self.prime()
+    self.create_file('BUILD')
+    self.assert_miss()
+    self.assert_hit()
+
+  def test_miss_options_changed(self):
+    self.prime()
+    for option, value in (('ide_gen_scala', False),
+                          ('ide_gen_java', False),
+                          ('ide_gen_intransitive', True),
+                          ('ide_gen_python', True)):
+      self.options[option] = value
+      self.assert_miss()
+      self.assert_hit()
+
+  def test_miss_paths_changed(self):
+    self.prime()
+    self.config['extra_jvm_source_paths'] = ['src/extra']
+    self.assert_miss()
+    self.assert_hit()
+
+    self.options['ide_gen_python'] = True
+    self.assert_miss()
+    self.config['python_source_paths'] = ['src/python']
+    self.assert_miss()
+    self.assert_hit()
+
+  def test_miss_version_changed(self):
+    self.prime()
+    version = ide_gen._PROJECT_CACHE_VERSION
+    ide_gen._PROJECT_CACHE_VERSION = version + 1
+    try:
+      self.assert_miss()
+    finally:
+      ide_gen._PROJECT_CACHE_VERSION = version
+
+  def test_corrupt_cache(self):
+    self.prime()
+    cache = self.ide_gen().project_cache
+    with open(cache, 'wb') as fp:
+      fp.write('garbage')
+    self.assert_miss()
+    self.assert_hit()
+
+  def test_truncated_cache(self):
+    self.prime()
+    cache = self.ide_gen().project_cache
+    with open(cache, 'rb') as fp:
+      contents = fp.read()
+    with open(cache, 'wb') as fp:
+      fp.write(contents[:len(contents) // 2])
+    self.assert_miss()
+    self.assert_hit()
+
+  def test_no_cache(self):
+    self.options['ide_gen_cache'] = False
+    ide_gen = self.ide_gen()
+    self.assertEqual(0, ide_gen.stores)
+    self.assertEqual(set(), ide_gen._project.inputs)
+
+
+class RootProjectCacheTest(ProjectCacheTestBase):
+
+  target_address = ':main'
+
+  @classmethod
+  def setUpClass(cls):
+    super(RootProjectCacheTest, cls).setUpClass()
+
+    # The root BUILD file's neighbors are searched for across the whole build root, pants workdir
+    # included.
+    cls.create_target('', dedent('''
+      java_library(name='main',
+        sources=['com/a/A.java'],
+      )
+    '''))
+    cls.create_file('com/a/A.java')
+    cls.create_dir('.pants.d')
+
+  def test_hit_after_work_dirs_change(self):
+    self.prime()
+
+    # Each run stages jars into freshly cleaned dirs under the project dir and other tasks write
+    # elsewhere under the pants workdir.
+    for run in range(3):
+      safe_mkdir(os.path.join(self.project_dir, 'internal-libs'), clean=True)
+      safe_mkdir(os.path.join(self.project_dir, 'external-libs'), clean=True)
+      safe_mkdir(os.path.join(self.pants_workdir, 'compile', str(run)))
+      self.assert_hit()
+
+  def test_miss_source_dir_added(self):
+    self.prime()
+    self.create_dir('com/a/b')
+    self.assert_miss()
+    self.assert_hit()
+
+  def test_miss_build_file_added(self):
+    self.prime()
+    self.create_file('com/b/BUILD')
+    self.assert_miss()
+    self.assert_hit()
+
+
+class StageAllTest(BaseBuildRootTest):
+
+  def setUp(self):
+    self.work_dir = safe_mkdtemp(dir=self.build_root)
+
+  def tearDown(self):
+    safe_rmtree(self.work_dir)
+
+  def path(self, name, contents=None):
+    path = os.path.join(self.work_dir, name)
+    if contents is not None:
+      with open(path, 'w') as fp:
+        fp.write(contents)
+    return path
+
+  def contents(self, name):
+    with open(self.path(name)) as fp:
+      return fp.read()
+
+  def test_stage_all(self):
+    ini = dedent('''
+      [DEFAULT]
+      pants_workdir: %(workdir)s
+
+      [ide]
+      debug_port: 5005
+    ''' % dict(workdir=self.work_dir)).strip()
+    task = RecordingIdeGen(create_context(config=ini, options=dict(
+        ide_gen_project_name='project',
+        ide_gen_project_dir=self.work_dir,
+        ide_gen_project_cwd=None,
+        ide_gen_intransitive=False,
+        ide_gen_python=False,
+        ide_gen_java=True,
+        ide_gen_java_language_level=6,
+        ide_gen_java_jdk=None,
+        ide_gen_scala=True,
+        ide_gen_cache=False)))
+
+    a = self.path('a', 'a')
+    b = self.path('b', 'b')
+    shared = self.path('shared', 'shared')
+    os.link(shared, self.path('linked'))
+
+    task._stage_all([(a, self.path('first')),
+                     (b, self.path('first')),
+                     (a, self.path('second')),
+                     (b, self.path('linked'))])
+
+    # The last pair staged to a dst wins, and an existing dst is replaced, not written through.
+    self.assertEqual('b', self.contents('first'))
+    self.assertEqual('a', self.contents('second'))
+    self.assertEqual('b', self.contents('linked'))
+    self.assertEqual('shared', self.contents('shared'))